@@ -40,10 +40,11 @@ param(
        - Download: https://github.com/UB-Mannheim/tesseract/wiki
        - Windows installer: tesseract-ocr-w64-setup-*.exe
        - Install to default location: C:\Program Files\Tesseract-OCR
-       - The installer should add Tesseract to PATH automatically
-       - Alternative: Manual setup if not in PATH:
-         $env:PATH += ";C:\Program Files\Tesseract-OCR"
-         Or in Python script: pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+       - The tessdata folder must contain eng.traineddata and osd.traineddata
+       - tesserocr links against the Tesseract library directly; on Windows install a
+         prebuilt tesserocr wheel that bundles Tesseract if pip cannot build it
+       - Point tesserocr at the language data via TESSDATA_PREFIX:
+         $env:TESSDATA_PREFIX = "C:\Program Files\Tesseract-OCR\tessdata"
     
     3. Poppler (Required for PDF to image conversion)
        - Download: https://github.com/oschwartz10612/poppler-windows/releases
@@ -57,24 +58,26 @@ param(
     4. Python packages (auto-installed by this script):
        - pikepdf: PDF manipulation
        - pdf2image: Convert PDF pages to images
-       - pytesseract: Python wrapper for Tesseract
+       - tesserocr: In-process Python bindings for Tesseract
        - Pillow: Image processing
+       - numpy: Confidence aggregation
        
        Manual installation if needed:
-       python -m pip install pikepdf pdf2image pytesseract Pillow
+       python -m pip install pikepdf pdf2image tesserocr Pillow numpy
     
     TROUBLESHOOTING:
-    - "Tesseract not found": Install Tesseract OCR and ensure it's in PATH
+    - "Failed to init API, possibly an invalid tessdata path": Set TESSDATA_PREFIX to
+      the tessdata folder containing eng.traineddata and osd.traineddata
     - "Unable to get page count": Install poppler and add bin folder to PATH
     - "No module named 'PIL'": Run: python -m pip install Pillow
     - "Permission denied": Run PowerShell as Administrator
     
     QUICK SETUP (copy and paste into PowerShell as Administrator):
     # Install Python packages
-    python -m pip install pikepdf pdf2image pytesseract Pillow
+    python -m pip install pikepdf pdf2image tesserocr Pillow numpy
     
-    # Add Tesseract and Poppler to PATH (update paths as needed)
-    [Environment]::SetEnvironmentVariable("Path", $env:Path + ";C:\Program Files\Tesseract-OCR", "Machine")
+    # Point tesserocr at Tesseract's data and add Poppler to PATH (update paths as needed)
+    [Environment]::SetEnvironmentVariable("TESSDATA_PREFIX", "C:\Program Files\Tesseract-OCR\tessdata", "Machine")
     [Environment]::SetEnvironmentVariable("Path", $env:Path + ";C:\Program Files\poppler\Library\bin", "Machine")
 #>
 
@@ -91,7 +94,7 @@ try {
 # Check if required packages are installed
 Write-Host "Checking for required Python packages..." -ForegroundColor Cyan
 
-$requiredPackages = @("pikepdf", "pdf2image", "pytesseract", "PIL")
+$requiredPackages = @("pikepdf", "pdf2image", "tesserocr", "PIL", "numpy")
 $missingPackages = @()
 
 foreach ($package in $requiredPackages) {
@@ -119,12 +122,13 @@ if ($missingPackages.Count -gt 0) {
 
 # Check for Tesseract OCR
 Write-Host "Checking for Tesseract OCR..." -ForegroundColor Cyan
-$tesseractCheck = python -c "import pytesseract; pytesseract.get_tesseract_version(); print('OK')" 2>&1
+# Initialise an OSD API so missing eng/osd traineddata is caught here, not per page
+$tesseractCheck = python -c "import tesserocr; tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.OSD_ONLY).End(); print('OK')" 2>&1
 
 if ($tesseractCheck -notlike "*OK*") {
-    Write-Host "Warning: Tesseract OCR not found or not configured" -ForegroundColor Yellow
+    Write-Host "Warning: Tesseract OCR could not be initialised (eng/osd language data not found)" -ForegroundColor Yellow
     Write-Host "Please install Tesseract from: https://github.com/tesseract-ocr/tesseract" -ForegroundColor Yellow
-    Write-Host "After installation, you may need to set the path in your script" -ForegroundColor Yellow
+    Write-Host "Then set TESSDATA_PREFIX to its tessdata folder, e.g. C:\Program Files\Tesseract-OCR\tessdata" -ForegroundColor Yellow
     $continue = Read-Host "Continue anyway? (y/n)"
     if ($continue -ne "y") {
         Exit 1
@@ -4,78 +4,220 @@ Fix PDF page rotations - processes all PDFs in a directory.
 Uses OCR (Tesseract) to detect optimal page orientation and corrects rotation.
 """
 
+import contextlib
+import io
+import numpy as np
 import pikepdf
 import sys
 import os
+import queue
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from pdf2image import convert_from_path
-import pytesseract
+
+# Tesseract's OpenMP threading slows OSD down; parallelism comes from our own pools
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+from tesserocr import PyTessBaseAPI, PSM, RIL, iterate_level
 from PIL import Image
 
-def detect_orientation(image):
+# Longest side (px) handed to Tesseract; OSD is accurate well below this
+OSD_MAX_SIZE = 1000
+
+# Transpose ops that rotate an image clockwise by the given angle
+CLOCKWISE_TRANSPOSE = {90: Image.ROTATE_270, 180: Image.ROTATE_180, 270: Image.ROTATE_90}
+
+# Rendering a few unneeded pages is cheaper than another pdfinfo + pdftoppm launch,
+# which re-parses the whole PDF; OCR candidates this close together share one render
+RENDER_MAX_GAP = 4
+
+# Content stream operators that show text; a page using any of them has a text layer
+TEXT_OPERATORS = 'Tj TJ \' "'
+
+def detect_orientation(image, api):
     """
     Detect the rotation needed to make text upright using OCR.
+    `api` is a PyTessBaseAPI in OSD_ONLY mode, reused across pages.
     Returns rotation angle (0, 90, 180, 270) and confidence score.
+    Raises RuntimeError if Tesseract fails on the image.
     """
+    # Downscale large renders; Tesseract runtime scales with pixel count
+    if max(image.size) > OSD_MAX_SIZE:
+        image = image.copy()
+        image.thumbnail((OSD_MAX_SIZE, OSD_MAX_SIZE), Image.BILINEAR)
+    
+    # Tesseract works in grayscale; convert once so every rotation below stays single-channel
+    if image.mode != 'L':
+        image = image.convert('L')
+    
+    # Use Tesseract's OSD (Orientation and Script Detection) in-process
+    api.SetImage(image)
+    osd = api.DetectOrientationScript()
+    if osd:
+        # orient_deg is the clockwise rotation of the image; correct by the opposite
+        rotation = (360 - osd['orient_deg']) % 360
+        return rotation, osd['orient_conf']
+    
+    # If OSD fails, try manual detection with different rotations. All four
+    # candidates are tiled side by side on one canvas so Tesseract recognizes
+    # them in a single pass; each word is credited to the tile it falls in.
+    angles = [0, 90, 180, 270]
+    cell = max(image.size)
+    margin = cell // 4
+    stride = cell + margin
+    canvas = Image.new('L', (len(angles) * stride - margin, cell), 255)
+    for k, angle in enumerate(angles):
+        # Lossless pixel shuffle; rotates clockwise by `angle` without resampling
+        rotated = image if angle == 0 else image.transpose(CLOCKWISE_TRANSPOSE[angle])
+        canvas.paste(rotated, (k * stride, 0))
+    
+    tiles = []
+    confidences = []
+    api.SetPageSegMode(PSM.AUTO)
     try:
-        # Use Tesseract's OSD (Orientation and Script Detection)
-        osd = pytesseract.image_to_osd(image)
-        
-        # Parse OSD output
-        rotation = 0
-        confidence = 0
-        for line in osd.split('\n'):
-            if line.startswith('Rotate:'):
-                rotation = int(line.split(':')[1].strip())
-            elif line.startswith('Orientation confidence:'):
-                confidence = float(line.split(':')[1].strip())
-        
-        return rotation, confidence
-    except Exception as e:
-        # If OSD fails, try manual detection with different rotations
-        best_angle = 0
-        best_confidence = 0
-        
-        for angle in [0, 90, 180, 270]:
-            try:
-                rotated = image.rotate(-angle, expand=True)  # Negative for counter-clockwise
-                result = pytesseract.image_to_data(rotated, output_type=pytesseract.Output.DICT)
-                
-                # Calculate average confidence of detected text
-                confidences = [int(conf) for conf in result['conf'] if conf != '-1']
-                if confidences:
-                    avg_conf = sum(confidences) / len(confidences)
-                    if avg_conf > best_confidence:
-                        best_confidence = avg_conf
-                        best_angle = angle
-            except:
-                continue
-        
-        return best_angle, best_confidence
+        api.SetImage(canvas)
+        api.Recognize()
+        words = api.GetIterator()
+        if words:
+            for word in iterate_level(words, RIL.WORD):
+                box = word.BoundingBox(RIL.WORD)
+                if box:
+                    tiles.append(min((box[0] + box[2]) // 2 // stride, len(angles) - 1))
+                    confidences.append(word.Confidence(RIL.WORD))
+    finally:
+        api.SetPageSegMode(PSM.OSD_ONLY)
+    
+    # Pick the rotation with the highest average confidence of detected text
+    tiles = np.asarray(tiles, dtype=np.intp)
+    confidences = np.asarray(confidences, dtype=np.float64)
+    valid = confidences >= 0
+    sums = np.bincount(tiles[valid], weights=confidences[valid], minlength=len(angles))
+    counts = np.bincount(tiles[valid], minlength=len(angles))
+    averages = np.divide(sums, counts, out=np.zeros(len(angles)), where=counts > 0)
+    best = int(np.argmax(averages))
+    
+    return angles[best], float(averages[best])
 
-def fix_pdf_rotation(input_path, output_path, dpi=200):
-    """Fix rotation for a single PDF file using OCR detection."""
+def _has_text(page):
+    """Return True if the page's content stream draws any text."""
+    try:
+        # Filter to text-showing operators inside qpdf, so no Python objects
+        # are built for the (often huge) rest of the content stream
+        return bool(pikepdf.parse_content_stream(page, TEXT_OPERATORS))
+    except Exception:
+        return False
+
+# Per-process pool of OSD-mode Tesseract APIs, kept loaded across files.
+# An API instance is not thread-safe, so each OCR thread borrows its own.
+_api_pool = queue.Queue()
+_api_count = 0
+
+def _load_tesseract(count):
+    """Ensure at least `count` Tesseract APIs are loaded in this process."""
+    global _api_count
+    while _api_count < count:
+        _api_pool.put(PyTessBaseAPI(psm=PSM.OSD_ONLY))
+        _api_count += 1
+
+def _init_worker():
+    """Process pool initializer: preload this worker's Tesseract API."""
+    try:
+        _load_tesseract(1)
+    except RuntimeError:
+        # e.g. tessdata not found; fix_pdf_rotation retries the load and
+        # reports the error per file instead of breaking the whole pool
+        pass
+
+def _detect_page(img_path):
+    """Detect orientation of one rendered page, borrowing a Tesseract API from the pool."""
+    api = _api_pool.get()
+    try:
+        # Load one page at a time so memory stays flat regardless of page count
+        with Image.open(img_path) as image:
+            # Let libjpeg decode at a reduced DCT scale; OSD only needs a thumbnail
+            image.draft('L', (OSD_MAX_SIZE, OSD_MAX_SIZE))
+            return detect_orientation(image, api)
+    finally:
+        _api_pool.put(api)
+        # The render is no longer needed; don't let a long document fill the temp dir
+        os.remove(img_path)
+
+def _page_runs(indices, max_gap=RENDER_MAX_GAP):
+    """Group sorted page indices into (first, last) runs, bridging gaps of up to `max_gap` pages."""
+    runs = []
+    for i in indices:
+        if runs and i - runs[-1][1] - 1 <= max_gap:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return runs
+
+def fix_pdf_rotation(input_path, output_path, dpi=100, thread_count=None, parallel_ocr=True):
+    """
+    Fix rotation for a single PDF file using OCR detection.
+    With `parallel_ocr`, pages are analysed on up to `thread_count` threads; directory
+    runs turn it off since they already run one file per core.
+    """
     try:
-        # Convert PDF pages to images for OCR analysis
-        print(f'  Converting PDF to images (DPI={dpi})...')
-        images = convert_from_path(input_path, dpi=dpi)
-        
         # Open PDF for modification
         pdf = pikepdf.open(input_path)
         fixed_pages = []
         
-        print(f'  Analyzing {len(images)} page(s) with OCR...')
+        # Pages that already carry a /Rotate (own or inherited from the page tree)
+        # or a text layer are trusted as-is; only the rest are rasterized for OCR
+        needs_ocr = [i for i, page in enumerate(pdf.pages)
+                     if page.rotation == 0 and not _has_text(page)]
+        skipped = len(pdf.pages) - len(needs_ocr)
+        if skipped:
+            print(f'  Skipping {skipped} page(s) with /Rotate set or a text layer')
+        
+        print(f'  Analyzing {len(needs_ocr)} page(s) with OCR (DPI={dpi})...')
+        
+        if thread_count is None:
+            thread_count = os.cpu_count() or 1
         
-        for i, (image, page) in enumerate(zip(images, pdf.pages)):
-            rotation_needed, confidence = detect_orientation(image)
+        # Load one Tesseract model per OCR thread; no-op when already loaded
+        ocr_threads = min(thread_count if parallel_ocr else 1, len(needs_ocr))
+        _load_tesseract(ocr_threads)
+        
+        # Render through a temp folder as JPEG: avoids holding PPM data in pipes
+        # and lets poppler render several pages of a run in parallel. The executor
+        # is entered last so its threads finish before the temp folder is removed.
+        with tempfile.TemporaryDirectory() as tempdir, \
+                ThreadPoolExecutor(max_workers=max(1, ocr_threads)) as ex:
+            # Each page's OSD starts as soon as its run is rendered, so rendering later
+            # runs overlaps with analysis and analysed renders are deleted meanwhile.
+            # Tesseract releases the GIL, so threads run OSD concurrently.
+            wanted = set(needs_ocr)
+            futures = []
+            for first, last in _page_runs(needs_ocr):
+                # Convert only this run of pages to image files for OCR analysis
+                run_paths = convert_from_path(input_path, dpi=dpi, first_page=first+1, last_page=last+1,
+                                              thread_count=thread_count, output_folder=tempdir, fmt='jpeg',
+                                              grayscale=True, paths_only=True)
+                for i, img_path in zip(range(first, last + 1), run_paths):
+                    if i in wanted:
+                        futures.append(ex.submit(_detect_page, img_path))
+                    else:
+                        # Bridged a gap between candidates; this page isn't analysed
+                        os.remove(img_path)
             
-            if rotation_needed != 0:
-                print(f'  Page {i+1}: Detected {rotation_needed}° rotation (confidence: {confidence:.1f}%) - correcting')
-                # Apply counter-rotation to make upright
-                page.Rotate = rotation_needed
-                fixed_pages.append((i+1, rotation_needed, confidence))
-            else:
-                print(f'  Page {i+1}: Already upright (confidence: {confidence:.1f}%)')
+            # Futures were submitted in page order, matching needs_ocr
+            for i, future in zip(needs_ocr, futures):
+                try:
+                    rotation_needed, confidence = future.result()
+                except RuntimeError as e:
+                    print(f'  Page {i+1}: ⚠ OCR failed ({e}) - leaving rotation unchanged')
+                    continue
+                
+                if rotation_needed != 0:
+                    print(f'  Page {i+1}: Detected {rotation_needed}° rotation (confidence: {confidence:.1f}%) - correcting')
+                    # Apply counter-rotation to make upright
+                    page = pdf.pages[i]
+                    page.Rotate = (page.rotation + rotation_needed) % 360
+                    fixed_pages.append((i+1, rotation_needed, confidence))
+                else:
+                    print(f'  Page {i+1}: Already upright (confidence: {confidence:.1f}%)')
         
         if fixed_pages:
             pdf.save(output_path)
@@ -92,6 +234,18 @@ def fix_pdf_rotation(input_path, output_path, dpi=200):
         print(f'  ✗ Error processing file: {e}')
         return False
 
+def _process_one(pdf_file, output_path, thread_count):
+    """
+    Fix a single PDF from a directory run. Top-level so worker processes can pickle it.
+    Returns whether the file was fixed and its captured log, so files running in
+    parallel don't interleave their output.
+    """
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        print(f"Processing: {os.path.basename(pdf_file)}")
+        fixed = fix_pdf_rotation(pdf_file, output_path, thread_count=thread_count, parallel_ocr=False)
+    return fixed, log.getvalue()
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: python fix-pdf-rotation.py <directory_or_file> [output_suffix]")
@@ -107,7 +261,8 @@ def main():
     
     if path.is_dir():
         # Process all PDFs in directory
-        pdf_files = list(path.glob("*.pdf"))
+        with os.scandir(path) as entries:
+            pdf_files = [e.path for e in entries if e.is_file() and e.name.lower().endswith('.pdf')]
         if not pdf_files:
             print(f"No PDF files found in {path}")
             sys.exit(1)
@@ -116,15 +271,25 @@ def main():
         
         processed = 0
         fixed = 0
-        for pdf_file in pdf_files:
-            print(f"Processing: {pdf_file.name}")
-            output_name = pdf_file.stem + output_suffix + pdf_file.suffix
-            output_path = pdf_file.parent / output_name
-            
-            if fix_pdf_rotation(str(pdf_file), str(output_path)):
-                fixed += 1
-            processed += 1
-            print()
+        max_workers = min(os.cpu_count() or 1, len(pdf_files))
+        # Split the cores between the workers; one thread each once files outnumber cores
+        thread_count = max(1, (os.cpu_count() or 1) // max_workers)
+        # Workers load their Tesseract model at startup and reuse it for every file
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as ex:
+            # Plain string slicing: "<stem>.pdf" -> "<stem><suffix>.pdf", keeping the extension's case
+            futures = {ex.submit(_process_one, p, p[:-4] + output_suffix + p[-4:], thread_count): p
+                       for p in pdf_files}
+            for future in as_completed(futures):
+                try:
+                    file_fixed, log = future.result()
+                except Exception as e:
+                    # The worker itself died (e.g. killed for memory); fix_pdf_rotation never returned
+                    file_fixed = False
+                    log = f"Processing: {os.path.basename(futures[future])}\n  ✗ Error processing file: {e}\n"
+                print(log)
+                if file_fixed:
+                    fixed += 1
+                processed += 1
         
         print(f"Summary: Processed {processed} files, fixed {fixed} files")
         